@@ -0,0 +1,294 @@
+# Бенчмарк SQL-запросов бота на синтетических данных: генерация, загрузка через COPY, замер задержек,
+# планы EXPLAIN и проверка регрессий (последовательное сканирование там, где должен работать индекс, и превышение бюджета).
+# Все таблицы в указанной базе очищаются — запускать только на отдельной локальной базе:
+# python benchmarks/bench_db_queries.py --dsn postgresql://localhost/lolibook_bench --rows 1000000 --plans-dir /tmp/plans
+# Код выхода 1, если хотя бы один запрос не прошёл проверку.
+import argparse
+import itertools
+import json
+import os
+import random
+import statistics
+import sys
+import time
+
+import psycopg2
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import main  # noqa: E402
+
+SYLLABLES = "ka ri mo na te lu sa vi do re mi fa zo ne ta ko ru shi an el or in".split()
+WORDS = [a + b + c for a, b, c in itertools.product(SYLLABLES, repeat=3)]
+GENRES = ("fantasy, science fiction, mystery, romance, horror, history, biography, poetry, drama, adventure, "
+          "детектив, фэнтези, классика, приключения, фантастика").split(', ')
+NOW = 1700000000  # Фиксированное «сейчас», чтобы данные не зависели от даты запуска
+
+# Файлоподобный объект для copy_expert: строки COPY генерируются по мере чтения, без буфера на всю таблицу
+class RowStream:
+    def __init__(self, rows):
+        self.rows = rows
+        self.buffer = ''
+
+    def read(self, size=65536):
+        while len(self.buffer) < size:
+            row = next(self.rows, None)
+            if row is None:
+                break
+            self.buffer += '\t'.join('\\N' if v is None else str(v) for v in row) + '\n'
+        chunk, self.buffer = self.buffer[:size], self.buffer[size:]
+        return chunk
+
+# Детерминированный набор данных: размеры таблиц задаются числом прочитанных книг (user_read)
+class Dataset:
+    def __init__(self, rows, seed):
+        self.seed = seed
+        self.rows = rows
+        self.books = max(rows // 5, 1000)
+        self.users = max(rows // 20, 100)
+        self.reads_per_user = max(rows // self.users, 1)
+        self.favorites_per_user = max(self.reads_per_user // 4, 1)
+        self.searches_per_user = max(self.reads_per_user // 2, 1)
+
+    def title(self, i):
+        rng = random.Random(self.seed * 1000003 + i)
+        return ' '.join(rng.choice(WORDS) for _ in range(rng.randint(2, 5))).capitalize()
+
+    def book_id(self, i):
+        return f"manual_{i}" if i % 100 == 0 else f"OL{i}W"
+
+    def user_id(self, i):
+        return 100000000 + i
+
+    def book_rows(self):
+        rng = random.Random(self.seed)
+        for i in range(self.books):
+            genres = ', '.join(rng.sample(GENRES, rng.randint(1, 3)))
+            author = f"{rng.choice(WORDS).capitalize()} {rng.choice(WORDS).capitalize()}"
+            yield self.book_id(i), self.title(i), f"Описание книги {i}", genres, main.PLACEHOLDER_COVER, author
+
+    def user_rows(self):
+        rng = random.Random(self.seed + 1)
+        for i in range(self.users):
+            user_id = self.user_id(i)
+            agreed = 1 if rng.random() < 0.9 else 0
+            banned_until = NOW + 86400 if rng.random() < 0.01 else 0
+            tz_offset = rng.choice((-300, 0, 60, 120, 180, 300, 420, 540))
+            rec_hour = rng.randrange(24)
+            slot = main.delivery_slot(user_id, tz_offset, rec_hour) if agreed else None
+            yield (user_id, f"user{i}", agreed, banned_until, rng.randint(0, 10), NOW - rng.randrange(30 * 86400),
+                   tz_offset, rec_hour, slot)
+
+    # Популярность книг неравномерна: часть пользователей читает из первых 5% каталога
+    def user_books(self, rng, count):
+        hot = max(self.books // 20, count)
+        return rng.sample(range(hot if rng.random() < 0.3 else self.books), count)
+
+    def read_rows(self):
+        rng = random.Random(self.seed + 2)
+        for i in range(self.users):
+            for book in self.user_books(rng, min(self.reads_per_user, self.books)):
+                yield self.user_id(i), self.book_id(book), rng.randint(1, 5) if rng.random() < 0.7 else None
+
+    def favorite_rows(self):
+        rng = random.Random(self.seed + 3)
+        for i in range(self.users):
+            for book in self.user_books(rng, min(self.favorites_per_user, self.books)):
+                yield self.user_id(i), self.book_id(book)
+
+    def history_rows(self):
+        rng = random.Random(self.seed + 4)
+        for i in range(self.users):
+            for _ in range(self.searches_per_user):
+                yield self.user_id(i), rng.choice(WORDS), NOW - rng.randrange(30 * 86400)
+
+    # Журнал добавлений и оценок за последние 30 дней (по нему считается дневной топ)
+    def activity_rows(self):
+        rng = random.Random(self.seed + 5)
+        for i in range(self.users):
+            for book in self.user_books(rng, min(self.searches_per_user, self.books)):
+                kind = rng.choice(('add', 'rate'))
+                details = {'book': self.book_id(book), 'rating': rng.randint(1, 5)} if kind == 'rate' else {'list': 'read', 'book': self.book_id(book)}
+                yield NOW - rng.randrange(30 * 86400), kind, self.user_id(i), json.dumps(details)
+
+    # Параметры запросов: существующие пользователи, фрагменты реальных названий
+    def random_user(self, rng):
+        return self.user_id(rng.randrange(self.users))
+
+    def random_fragment(self, rng):
+        words = self.title(rng.randrange(self.books)).split()
+        start = rng.randrange(len(words) - 1)
+        return ' '.join(words[start:start + 2]).lower()
+
+TABLES = (
+    ('books', '(id, title, description, genres, cover_url, author)', 'book_rows'),
+    ('users', '(user_id, username, agreed, banned_until, requests, last_request, tz_offset, rec_hour, delivery_slot)', 'user_rows'),
+    ('user_read', '(user_id, book_id, rating)', 'read_rows'),
+    ('user_favorites', '(user_id, book_id)', 'favorite_rows'),
+    ('search_history', '(user_id, query, timestamp)', 'history_rows'),
+    ('activity_events', '(ts, kind, user_id, details)', 'activity_rows'),
+)
+
+# Схема берётся из init_db бота, чтобы бенчмарк проверял те же индексы, что и в продакшене
+def load(dsn, dataset):
+    main.init_db()
+    conn = psycopg2.connect(dsn)
+    c = conn.cursor()
+    c.execute("TRUNCATE TABLE books, user_read, user_favorites, users, search_history, stats_counters, stats_daily, book_rating_stats, activity_events")
+    for table, columns, generator in TABLES:
+        started = time.perf_counter()
+        c.copy_expert(f"COPY {table} {columns} FROM STDIN", RowStream(getattr(dataset, generator)()))
+        print(f"COPY {table}: {c.rowcount} строк за {time.perf_counter() - started:.1f} с")
+    main.rebuild_stats(c)
+    main.backfill_rating_stats(c)
+    conn.commit()
+    conn.autocommit = True
+    c.execute("VACUUM ANALYZE")
+    conn.close()
+
+# Имя, SQL (как в main.py), параметры, бюджет p95 в мс, таблицы, которые можно читать последовательно
+# (фоновые агрегаты и рассылка обходят таблицу целиком по определению, частый жанр и соединение дневного топа
+# с каталогом выгоднее сканировать); остальные таблицы в плане по умолчанию должны читаться по индексу
+QUERIES = (
+    ('rate_limit_user', "SELECT requests, last_request FROM users WHERE user_id = %s",
+     lambda ds, rng: (ds.random_user(rng),), 5, ()),
+    ('read_list', "SELECT b.title, ur.rating FROM user_read ur JOIN books b ON ur.book_id = b.id WHERE ur.user_id = %s",
+     lambda ds, rng: (ds.random_user(rng),), 20, ()),
+    ('favorites_list', "SELECT b.title FROM user_favorites uf JOIN books b ON uf.book_id = b.id WHERE uf.user_id = %s",
+     lambda ds, rng: (ds.random_user(rng),), 20, ()),
+    ('read_cards', """SELECT b.id, b.title, b.description, b.genres, b.cover_url, ur.rating, rs.rating_count, rs.rating_sum FROM user_read ur
+                      JOIN books b ON ur.book_id = b.id LEFT JOIN book_rating_stats rs ON rs.book_id = b.id WHERE ur.user_id = %s""",
+     lambda ds, rng: (ds.random_user(rng),), 30, ()),
+    ('favorite_cards', """SELECT b.id, b.title, b.description, b.genres, b.cover_url, rs.rating_count, rs.rating_sum FROM user_favorites uf
+                          JOIN books b ON uf.book_id = b.id LEFT JOIN book_rating_stats rs ON rs.book_id = b.id WHERE uf.user_id = %s""",
+     lambda ds, rng: (ds.random_user(rng),), 30, ()),
+    ('title_ilike', "SELECT id FROM books WHERE title ILIKE %s",
+     lambda ds, rng: (f'%{ds.random_fragment(rng)}%',), 50, ()),
+    ('local_title_search', "SELECT id, title, description, genres, cover_url FROM books WHERE title ILIKE %s LIMIT 1",
+     lambda ds, rng: (f'%{ds.random_fragment(rng)}%',), 50, ()),
+    ('local_author_search', "SELECT id, title, description, genres, cover_url FROM books WHERE author ILIKE %s LIMIT 1",
+     lambda ds, rng: (f'%{rng.choice(WORDS)}%',), 50, ()),
+    ('local_genre_search', "SELECT id, title, description, genres, cover_url FROM books WHERE genres ILIKE %s ORDER BY random() LIMIT 1",
+     lambda ds, rng: (f'%{rng.choice(GENRES)}%',), 2000, ('books',)),
+    ('csv_title_match', "SELECT lower(title), id FROM books WHERE lower(title) = ANY(%s)",
+     lambda ds, rng: ([ds.title(rng.randrange(ds.books)).lower() for _ in range(50)],), 20, ()),
+    ('manual_books', "SELECT id, title FROM books WHERE id LIKE 'manual_%%'",
+     lambda ds, rng: (), 200, ()),
+    ('community_rating', "SELECT rating_count, rating_sum FROM book_rating_stats WHERE book_id = %s",
+     lambda ds, rng: (ds.book_id(rng.randrange(ds.books)),), 5, ()),
+    ('top_rated', """SELECT b.title, rs.rating_count, rs.rating_sum FROM book_rating_stats rs JOIN books b ON b.id = rs.book_id
+                     WHERE rs.rating_count >= %s ORDER BY rs.avg_rating DESC, rs.rating_count DESC LIMIT 10""",
+     lambda ds, rng: (main.TOP_RATED_MIN_VOTES,), 20, ()),
+    ('admin_stats_counters', "SELECT name, value FROM stats_counters",
+     lambda ds, rng: (), 5, ('stats_counters',)),
+    ('daily_slot_users', """SELECT u.user_id, string_agg(b.genres, ',') FROM users u
+                            JOIN user_favorites uf ON uf.user_id = u.user_id JOIN books b ON b.id = uf.book_id
+                            WHERE u.delivery_slot = %s AND u.agreed = 1 AND (u.banned_until IS NULL OR u.banned_until < %s)
+                            GROUP BY u.user_id""",
+     lambda ds, rng: (rng.randrange(main.DELIVERY_SLOTS), NOW), 500, ()),
+    ('broadcast_users', "SELECT user_id FROM users WHERE agreed = 1 AND (banned_until IS NULL OR banned_until < %s)",
+     lambda ds, rng: (NOW,), 2000, ('users',)),
+    ('rollup_dau', "SELECT COUNT(*) FROM users WHERE last_request >= %s",
+     lambda ds, rng: (NOW - 86400,), 200, ()),
+    ('rollup_searches', "SELECT COUNT(*) FROM search_history WHERE timestamp >= %s",
+     lambda ds, rng: (NOW - 86400,), 500, ()),
+    ('rollup_top_genres', """SELECT TRIM(g), COUNT(*) FROM activity_events e JOIN books b ON b.id = e.details->>'book',
+                             unnest(string_to_array(b.genres, ',')) g WHERE e.ts >= %s AND e.kind IN ('add', 'rate')
+                             GROUP BY TRIM(g) ORDER BY COUNT(*) DESC LIMIT 5""",
+     lambda ds, rng: (NOW - 86400,), 2000, ('books',)),
+    ('rollup_top_books', """SELECT b.title, COUNT(*) FROM activity_events e JOIN books b ON b.id = e.details->>'book'
+                            WHERE e.ts >= %s AND e.kind IN ('add', 'rate') GROUP BY b.id, b.title ORDER BY COUNT(*) DESC LIMIT 5""",
+     lambda ds, rng: (NOW - 86400,), 2000, ('books',)),
+    ('rollup_delivery_peak', """SELECT COALESCE(MAX(n), 0), COALESCE(SUM(n), 0) FROM
+                                (SELECT COUNT(*) n FROM users WHERE agreed = 1 GROUP BY delivery_slot) s""",
+     lambda ds, rng: (), 2000, ('users',)),
+)
+
+# Таблицы, которые план читает последовательным сканированием
+def seq_scans(plan):
+    found = set()
+    if plan.get('Node Type') == 'Seq Scan':
+        found.add(plan['Relation Name'])
+    for child in plan.get('Plans', ()):
+        found |= seq_scans(child)
+    return found
+
+# План запроса в JSON, корневой узел
+def explain(c, sql, params):
+    c.execute("EXPLAIN (FORMAT JSON) " + sql, params)
+    return c.fetchone()[0][0]['Plan']
+
+# Регрессия плана: последовательные сканирования в плане, который планировщик выбирает с настройками по умолчанию,
+# и в плане с запрещённым seq scan — там он остаётся, только если подходящего индекса нет вовсе
+def check_plan(c, sql, params):
+    planned = seq_scans(explain(c, sql, params))
+    c.execute("SET enable_seqscan = off")
+    try:
+        unindexed = seq_scans(explain(c, sql, params))
+    finally:
+        c.execute("RESET enable_seqscan")
+    return planned, unindexed
+
+def run_query(c, dataset, rng, name, sql, make_params, repeat, plans_dir):
+    params = make_params(dataset, rng)
+    c.execute(sql, params)  # Прогрев кэша
+    c.fetchall()
+    latencies = []
+    for _ in range(repeat):
+        params = make_params(dataset, rng)
+        started = time.perf_counter()
+        c.execute(sql, params)
+        rows = len(c.fetchall())
+        latencies.append((time.perf_counter() - started) * 1000)
+    if plans_dir:
+        c.execute("EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) " + sql, params)
+        with open(os.path.join(plans_dir, f"{name}.json"), 'w', encoding='utf-8') as f:
+            json.dump(c.fetchone()[0], f, ensure_ascii=False, indent=2)
+    latencies.sort()
+    return statistics.median(latencies), latencies[min(int(len(latencies) * 0.95), len(latencies) - 1)], rows, check_plan(c, sql, params)
+
+def main_bench():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--dsn', required=True, help='Отдельная база для бенчмарка (все таблицы будут очищены)')
+    parser.add_argument('--rows', type=int, default=100000, help='Строк в user_read; остальные таблицы масштабируются от него')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--budget-scale', type=float, default=1.0, help='Множитель бюджетов для медленных машин')
+    parser.add_argument('--skip-load', action='store_true', help='Использовать уже загруженные данные с теми же --rows и --seed')
+    parser.add_argument('--plans-dir', help='Куда сохранить планы EXPLAIN ANALYZE в JSON')
+    parser.add_argument('--only', nargs='*', help='Запустить только указанные запросы')
+    args = parser.parse_args()
+
+    main.DB_CONN_STRING = args.dsn
+    main.DB_READ_CONN_STRING = None
+    dataset = Dataset(args.rows, args.seed)
+    if not args.skip_load:
+        load(args.dsn, dataset)
+    if args.plans_dir:
+        os.makedirs(args.plans_dir, exist_ok=True)
+
+    conn = psycopg2.connect(args.dsn)
+    conn.autocommit = True
+    c = conn.cursor()
+    rng = random.Random(args.seed)
+    failures = []
+    print(f"{'запрос':<24}{'p50, мс':>10}{'p95, мс':>10}{'бюджет':>10}{'строк':>8}  {'seq scan':<24}без индекса")
+    for name, sql, make_params, budget, seq_ok in QUERIES:
+        if args.only and name not in args.only:
+            continue
+        p50, p95, rows, (planned, unindexed) = run_query(c, dataset, rng, name, sql, make_params, args.repeat, args.plans_dir)
+        budget *= args.budget_scale
+        print(f"{name:<24}{p50:>10.2f}{p95:>10.2f}{budget:>10.0f}{rows:>8}  {', '.join(sorted(planned)) or '-':<24}{', '.join(sorted(unindexed)) or '-'}")
+        if planned - set(seq_ok):
+            failures.append(f"{name}: планировщик выбирает последовательное сканирование {', '.join(sorted(planned - set(seq_ok)))}")
+        if unindexed - set(seq_ok):
+            failures.append(f"{name}: нет подходящего индекса для {', '.join(sorted(unindexed - set(seq_ok)))}")
+        if p95 > budget:
+            failures.append(f"{name}: p95 {p95:.1f} мс больше бюджета {budget:.0f} мс")
+    conn.close()
+
+    for failure in failures:
+        print(f"FAIL {failure}")
+    sys.exit(1 if failures else 0)
+
+if __name__ == '__main__':
+    main_bench()
@@ -0,0 +1,68 @@
+# Бенчмарк inline-индекса: время построения, память на название и задержка запроса.
+# Запуск из корня репозитория: python benchmarks/bench_inline_index.py --titles 1000000
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from main import TitleIndex  # noqa: E402
+
+WORDS = ("war peace night day dark light king queen stone fire ice shadow city river house garden ship star "
+         "moon sun secret lost last first little great old new black white red blue golden silver silent "
+         "война мир ночь день тьма свет король королева камень огонь лёд тень город река дом сад звезда").split()
+NAMES = "Leo Anna Ivan Maria John Jane Fyodor Olga Mark Ellen Tolstoy Austen Dostoevsky Tolkien King Christie Orwell".split()
+
+def synthetic_titles(count, seed=42):
+    rng = random.Random(seed)
+    for i in range(count):
+        title = ' '.join(rng.choice(WORDS) for _ in range(rng.randint(1, 5))).capitalize()
+        author = f"{rng.choice(NAMES)} {rng.choice(NAMES)}"
+        yield f"OL{i}W", f"{title} {i % 997}", author
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--titles', type=int, default=1000000)
+    parser.add_argument('--queries', type=int, default=10000)
+    parser.add_argument('--memory-sample', type=int, default=100000)
+    args = parser.parse_args()
+
+    books = list(synthetic_titles(args.titles))
+    started = time.perf_counter()
+    index = TitleIndex()
+    for book_id, title, author in books:
+        index.add(book_id, title, author)
+    build_time = time.perf_counter() - started
+
+    # Память меряем отдельной сборкой на выборке: tracemalloc сильно замедляет построение
+    sample = books[:args.memory_sample]
+    tracemalloc.start()
+    sample_index = TitleIndex()
+    for book_id, title, author in sample:
+        sample_index.add(book_id, title, author)
+    memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del sample_index
+
+    rng = random.Random(7)
+    latencies = []
+    for _ in range(args.queries):
+        _, title, _ = rng.choice(books)
+        words = title.split()
+        query = ' '.join(words[:rng.randint(1, len(words))])
+        query = query[:rng.randint(1, len(query))]
+        started = time.perf_counter()
+        index.search(query)
+        latencies.append((time.perf_counter() - started) * 1000)
+    latencies.sort()
+
+    print(f"Названий: {len(index)}")
+    print(f"Построение: {build_time:.1f} с ({len(index) / build_time:.0f} названий/с)")
+    print(f"Память: {memory / len(sample):.0f} байт на название без самих строк названий (~{memory / len(sample) * len(index) / 2 ** 20:.0f} МБ на весь индекс)")
+    print(f"Запрос: p50 {statistics.median(latencies):.2f} мс, p99 {latencies[int(len(latencies) * 0.99)]:.2f} мс, max {latencies[-1]:.2f} мс")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,51 @@
+# Бенчмарк стоимости логирования на одно обновление: прежний синхронный basicConfig против очереди с выборкой.
+# Запуск из корня репозитория: python benchmarks/bench_logging.py --updates 200000
+import argparse
+import logging
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import main  # noqa: E402
+
+def run(updates, emit):
+    started = time.perf_counter()
+    for i in range(updates):
+        emit(i)
+    return (time.perf_counter() - started) / updates * 1e6
+
+def main_bench():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--updates', type=int, default=200000)
+    args = parser.parse_args()
+    root = logging.getLogger()
+    text = "Какая-нибудь книга про войну и мир " * 3
+
+    with tempfile.TemporaryFile('w', encoding='utf-8') as sync_out, tempfile.TemporaryFile('w', encoding='utf-8') as async_out:
+        # Прежняя схема: форматирование и запись в поток прямо в цикле событий
+        main.stop_logging(main.log_listener)
+        sync_handler = logging.StreamHandler(sync_out)
+        sync_handler.setFormatter(logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s'))
+        root.handlers[:] = [sync_handler]
+        before = run(args.updates, lambda i: (main.logger.info(f"Обработка callback: page_read_{i} для пользователя {i}"),
+                                              main.logger.info(f"Получено сообщение: {text} в состоянии search_title от {i}")))
+
+        # Новая схема: в цикле событий только постановка в очередь; фоновый поток на время замера
+        # остановлен, чтобы отделить стоимость горячего пути от форматирования и записи
+        listener = main.log_listener = main.setup_logging(async_out)
+        main.stop_logging(listener)
+        for rate in (1.0, 0.1):
+            main.LOG_SAMPLE_RATES.update(callback=rate, message=rate)
+            after = run(args.updates, lambda i: (main.log_event('callback', data=f'page_read_{i}', user_id=i),
+                                                 main.log_event('message', state='search_title', user_id=i, length=len(text))))
+            print(f"Очередь + JSON, выборка {rate:.0%}: {after:.2f} мкс на обновление в цикле событий")
+        drain_started = time.perf_counter()
+        listener.start()
+        main.stop_logging(listener)
+        print(f"Форматирование и запись накопленной очереди в фоновом потоке: {time.perf_counter() - drain_started:.2f} с")
+        print(f"Синхронный basicConfig: {before:.2f} мкс на обновление в цикле событий")
+
+if __name__ == '__main__':
+    main_bench()